@@ -0,0 +1,80 @@
+import cv2
+import math
+import numpy
+
+#------------------------------------------------
+# Corner Refinement
+#
+# The document quad is found on a small version
+# of the frame, so once scaled back up each corner
+# can be several full resolution pixels off.
+#
+# Running edge detection on the whole full frame
+# is too slow, so instead we crop a small window
+# around each coarse corner, and refine the corner
+# to sub-pixel accuracy inside that window only.
+#------------------------------------------------
+
+# stop after this many iterations or when the corner moves less than this (px)
+SUBPIX_CRITERIA = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.01)
+
+
+def refine_corners(image, corners, ratio, window=8):
+    #------------------------------------------------
+    # image   - full resolution frame (BGR or gray)
+    # corners - 4x2 coarse corners, in full frame
+    #           coordinates
+    # ratio   - full frame / processed frame scale,
+    #           i.e. how far off the coarse corners
+    #           can be
+    # window  - minimum half size of the cornerSubPix
+    #           window (it is grown to cover the
+    #           largest allowed shift)
+    #
+    # Returns the refined 4x2 corners.  A corner that
+    # can't be refined (too close to the edge of the
+    # frame, or wandering off too far) keeps its
+    # coarse position.
+    #------------------------------------------------
+
+    (height, width) = image.shape[:2]
+
+    # how far we allow a corner to move: the coarse corner is
+    # typically 2-3 px off on the processed image (blur/threshold
+    # plus the approxPolyDP vertex choice), and blunt corners get
+    # rounded off a bit more - so allow up to 4 processed px
+    max_shift = max(4.0 * ratio, 4.0)
+
+    # the search window has to reach the true corner from the coarse one
+    window = max(int(window), int(math.ceil(max_shift)) + 2)
+
+    # patch half size: the search window plus room to move
+    half = int(window + math.ceil(max_shift) + 2)
+
+    refined = numpy.array(corners, dtype="float32").reshape(4, 2)
+
+    for i in range(4):
+        (cx, cy) = refined[i]
+
+        x0 = int(cx) - half
+        y0 = int(cy) - half
+        x1 = int(cx) + half + 1
+        y1 = int(cy) + half + 1
+
+        if x0 < 0 or y0 < 0 or x1 > width or y1 > height:
+            continue
+
+        patch = image[y0:y1, x0:x1]
+        if len(patch.shape) == 3:
+            patch = cv2.cvtColor(patch, cv2.COLOR_BGR2GRAY)
+
+        point = numpy.array([[[cx - x0, cy - y0]]], dtype="float32")
+        cv2.cornerSubPix(patch, point, (window, window), (-1, -1), SUBPIX_CRITERIA)
+
+        (px, py) = point[0][0]
+        if abs(px - (cx - x0)) > max_shift or abs(py - (cy - y0)) > max_shift:
+            continue
+
+        refined[i] = (px + x0, py + y0)
+
+    return refined
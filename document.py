@@ -4,6 +4,7 @@ import imutils
 import numpy
 import time
 
+from frames import DocumentState
 from settings import Settings
 
 
@@ -40,23 +41,10 @@ class DocumentDetector():
         # Cached Frames
         #-------------------------------
 
-        # full frames
-        self.cur_frame_full = None
-        self.bg_frame_full = None
-        self.prev_frame_full = None
-
-        # processed frames
-        self.cur_frame = None
-        self.cur_frame_gray = None
-
-        self.prev_frame = None
-        self.prev_frame_gray = None
-
-        self.bg_frame = None
-        self.bg_frame_gray = None
-
-        # display frames
-        self.bg_delta = None
+        # small processed frames only - the full frame
+        # belongs to the caller
+        self.state = DocumentState()
+        self.state.roi_boxes = []
 
 
 
@@ -67,6 +55,15 @@ class DocumentDetector():
         return self.document_detected
 
 
+    def display_frames(self, viewer):
+        # Background Delta
+        viewer.update("Background Delta", self.state.cur_frame_gray, self.state.roi_boxes)
+
+
+    def buffers(self):
+        return self.state.buffers()
+
+
     def _process_frame(self, frame):
         #------------------------------------------------
         # Process the Frame
@@ -75,30 +72,26 @@ class DocumentDetector():
         # for document detection.
         #------------------------------------------------
 
-        self.cur_frame_full = frame.copy()
+        state = self.state
 
         # create a smaller version of the image for faster processing
-        self.cur_frame = imutils.resize(self.cur_frame_full, width=500)
+        # (no need to copy the full frame - we only read it)
+        cur_frame = imutils.resize(frame, width=500)
 
         # create a softened (blurred) grayscale version of the smaller image
-        self.cur_frame_gray = cv2.cvtColor(self.cur_frame, cv2.COLOR_BGR2GRAY)
-        self.cur_frame_gray = cv2.GaussianBlur(self.cur_frame_gray, (21, 21), 0)
+        cur_frame_gray = cv2.cvtColor(cur_frame, cv2.COLOR_BGR2GRAY)
+        state.cur_frame_gray = cv2.GaussianBlur(cur_frame_gray, (21, 21), 0)
 
-        # set background frames
+        # set background frame
         # (for now, just do this *once* at startup)
-        if not is_valid_frame(self.bg_frame_full):
-            self.bg_frame_full = self.cur_frame_full.copy()
-
-        if not is_valid_frame(self.bg_frame):
-            self.bg_frame = self.cur_frame_gray
-        
-        self.delta_display_frame = self.cur_frame.copy()
+        if not is_valid_frame(state.bg_frame):
+            state.bg_frame = state.cur_frame_gray
 
 
     def _calculate_bg_delta(self):
-        self.bg_delta = self.cur_frame_gray.copy()
-        
-        frameDelta = cv2.absdiff(self.bg_frame, self.cur_frame_gray)
+        roi_boxes = []
+
+        frameDelta = cv2.absdiff(self.state.bg_frame, self.state.cur_frame_gray)
 
         thresh = cv2.threshold(frameDelta, 45, 255, cv2.THRESH_BINARY)[1]
         thresh = cv2.dilate(thresh, None, iterations=2)
@@ -112,13 +105,14 @@ class DocumentDetector():
             if cv2.contourArea(c) < self.min_roi_area:
                 continue
             
-            # compute the bounding box for the contour and draw it on the frame
-            (x, y, w, h) = cv2.boundingRect(c)
-            cv2.rectangle(self.bg_delta, (x, y), (x + w, y + h), (0, 255, 0), 2)
+            # compute the bounding box for the contour (the viewer draws it)
+            roi_boxes.append(cv2.boundingRect(c))
 
             # TODO - actually detect a document!
             self.document_detected = True
 
+        self.state.roi_boxes = roi_boxes
+
         return self.document_detected
 
 
@@ -0,0 +1,220 @@
+import argparse
+import cv2
+import numpy
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from settings import Settings
+
+
+class EncodingProfile():
+
+    #------------------------------------------------
+    # A named way of encoding a scan: file format,
+    # OpenCV encoder parameters and whether to drop
+    # the color first.
+    #------------------------------------------------
+
+    def __init__(self, name, extension, params=None, grayscale=False):
+        self.name = name
+        self.extension = extension
+        self.params = params or []
+        self.grayscale = grayscale
+
+
+PROFILES = {}
+
+def add_profile(profile):
+    PROFILES[profile.name] = profile
+    return profile
+
+
+# lossless
+add_profile(EncodingProfile("png", ".png", [cv2.IMWRITE_PNG_COMPRESSION, 3]))
+add_profile(EncodingProfile("png-fast", ".png", [cv2.IMWRITE_PNG_COMPRESSION, 1]))
+add_profile(EncodingProfile("png-small", ".png", [cv2.IMWRITE_PNG_COMPRESSION, 9]))
+add_profile(EncodingProfile("webp-lossless", ".webp", [cv2.IMWRITE_WEBP_QUALITY, 101]))
+
+# lossy
+add_profile(EncodingProfile("jpeg-95", ".jpg", [cv2.IMWRITE_JPEG_QUALITY, 95]))
+add_profile(EncodingProfile("jpeg-85", ".jpg", [cv2.IMWRITE_JPEG_QUALITY, 85]))
+add_profile(EncodingProfile("jpeg-70", ".jpg", [cv2.IMWRITE_JPEG_QUALITY, 70]))
+add_profile(EncodingProfile("webp-90", ".webp", [cv2.IMWRITE_WEBP_QUALITY, 90]))
+add_profile(EncodingProfile("webp-75", ".webp", [cv2.IMWRITE_WEBP_QUALITY, 75]))
+
+# grayscale (text documents)
+add_profile(EncodingProfile("gray-png", ".png", [cv2.IMWRITE_PNG_COMPRESSION, 3], grayscale=True))
+add_profile(EncodingProfile("gray-jpeg-85", ".jpg", [cv2.IMWRITE_JPEG_QUALITY, 85], grayscale=True))
+
+
+class EncodedImage():
+
+    def __init__(self, profile, data, seconds):
+        self.profile = profile
+        self.data = data
+        self.seconds = seconds
+
+
+class Encoder():
+
+    #------------------------------------------------
+    # Encoder
+    #
+    # Encodes images in a thread pool.  OpenCV's
+    # encoders release the GIL, so the encodes really
+    # do run alongside the capture/detection loop.
+    #------------------------------------------------
+
+    #-------------------------------
+    # init
+    #-------------------------------
+
+    def __init__(self, workers=None):
+
+        # settings
+        self.settings = Settings()
+
+        #-------------------------------
+        # Settings
+        #-------------------------------
+
+        self.workers = workers or self.settings.encode_workers
+
+
+        #-------------------------------
+        # Internal Data
+        #-------------------------------
+
+        self.pool = ThreadPoolExecutor(max_workers=self.workers)
+
+
+
+    #-------------------------------
+    # Public Methods
+    #-------------------------------
+
+    def submit(self, image, profile):
+        # returns a Future of an EncodedImage
+        return self.pool.submit(encode, image, profile)
+
+
+    def shutdown(self):
+        # waits for the queued encodes to finish
+        self.pool.shutdown(wait=True)
+
+
+
+# Helper Functions
+
+def get_profile(profile):
+    if isinstance(profile, EncodingProfile):
+        return profile
+
+    if profile not in PROFILES:
+        raise ValueError("unknown encoding profile: %s (known: %s)" % (profile, ", ".join(sorted(PROFILES))))
+
+    return PROFILES[profile]
+
+
+def encode(image, profile):
+    profile = get_profile(profile)
+
+    start_time = time.time()
+
+    if profile.grayscale and len(image.shape) == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+    ok, encoded = cv2.imencode(profile.extension, image, profile.params)
+    if not ok:
+        raise RuntimeError("cannot encode image as %s" % profile.name)
+
+    return EncodedImage(profile, encoded.tobytes(), time.time() - start_time)
+
+
+#-------------------------------
+# Benchmark
+#-------------------------------
+
+def benchmark(images, profiles=None, repeat=3):
+    #------------------------------------------------
+    # Encode every image with every profile and
+    # report the best encode time, the size and the
+    # PSNR against the original (inf == lossless).
+    #
+    # Every profile is scored against the same color
+    # original, so dropping the color (gray-*) costs
+    # quality like any other loss.
+    #
+    # Encodes are timed one at a time so the numbers
+    # are per encode, not per pool.
+    #------------------------------------------------
+
+    profiles = [get_profile(p) for p in (profiles or sorted(PROFILES))]
+
+    rows = []
+    for profile in profiles:
+        seconds = []
+        sizes = []
+        scores = []
+
+        for image in images:
+            best = None
+            for _ in range(repeat):
+                encoded = encode(image, profile)
+                if best is None or encoded.seconds < best.seconds:
+                    best = encoded
+
+            decoded = cv2.imdecode(numpy.frombuffer(best.data, dtype=numpy.uint8), cv2.IMREAD_UNCHANGED)
+            if len(decoded.shape) == 2 and len(image.shape) == 3:
+                decoded = cv2.cvtColor(decoded, cv2.COLOR_GRAY2BGR)
+
+            seconds.append(best.seconds)
+            sizes.append(len(best.data))
+            scores.append(psnr(image, decoded))
+
+        rows.append({
+            "profile": profile.name,
+            "ms": 1000.0 * sum(seconds) / len(seconds),
+            "bytes": sum(sizes) / len(sizes),
+            "psnr": min(scores),
+        })
+
+    return rows
+
+
+def psnr(reference, image):
+    if numpy.array_equal(reference, image):
+        return float("inf")
+
+    return cv2.PSNR(reference, image)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the scan encoding profiles.")
+    parser.add_argument("images", nargs="+", help="sample scans")
+    parser.add_argument("--profiles", help="comma separated profile names (default: all)")
+    parser.add_argument("--repeat", type=int, default=3, help="encodes per image (best time is kept)")
+
+    args = parser.parse_args()
+
+    images = []
+    for path in args.images:
+        image = cv2.imread(path)
+        if image is None:
+            print("ERROR - cannot read %s" % path)
+            continue
+        images.append(image)
+
+    if not images:
+        return
+
+    profiles = args.profiles.split(",") if args.profiles else None
+
+    print("%-16s %10s %12s %10s" % ("profile", "encode ms", "bytes", "psnr dB"))
+    for row in benchmark(images, profiles, args.repeat):
+        print("%-16s %10.1f %12d %10.2f" % (row["profile"], row["ms"], row["bytes"], row["psnr"]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+import numpy
+import threading
+
+#------------------------------------------------
+# Frame State
+#
+# Each component keeps the frames it needs in one
+# small __slots__ state object, so it is obvious
+# which buffers are alive and who owns them.
+#
+# Full resolution frames are owned by ScanBot for
+# a single loop iteration only; the detectors keep
+# nothing but their small processed frames.
+#------------------------------------------------
+
+
+class FrameState():
+
+    __slots__ = ()
+
+    def __init__(self):
+        self.clear()
+
+
+    def clear(self):
+        for name in self.__slots__:
+            setattr(self, name, None)
+
+
+    def buffers(self):
+        for name in self.__slots__:
+            value = getattr(self, name)
+            if isinstance(value, numpy.ndarray):
+                yield name, value
+
+
+class ScanState(FrameState):
+
+    # cur_frame_full - the camera frame, for the current loop iteration only
+    __slots__ = ("cur_frame_full",)
+
+
+class MotionState(FrameState):
+
+    # cur_frame       - resized current frame (display)
+    # cur_frame_gray  - resized, blurred gray current frame
+    # prev_frame_gray - cur_frame_gray of the previous frame
+    # motion_boxes    - bounding boxes of the last motion
+    __slots__ = ("cur_frame", "cur_frame_gray", "prev_frame_gray", "motion_boxes")
+
+
+class DocumentState(FrameState):
+
+    # cur_frame_gray - resized, blurred gray current frame
+    # bg_frame       - cur_frame_gray of the first frame
+    # roi_boxes      - bounding boxes of the changed regions
+    __slots__ = ("cur_frame_gray", "bg_frame", "roi_boxes")
+
+
+class PendingFrames():
+
+    #------------------------------------------------
+    # Frames handed to background work (e.g. a scan
+    # being encoded and stored), kept here by key
+    # until that work is done, so they show up in
+    # the memory report.
+    #------------------------------------------------
+
+    def __init__(self):
+        self._frames = {}
+        self._lock = threading.Lock()
+
+
+    def add(self, key, frames):
+        # frames - {name: frame}
+        with self._lock:
+            self._frames[key] = frames
+
+
+    def remove(self, key):
+        with self._lock:
+            self._frames.pop(key, None)
+
+
+    def buffers(self):
+        with self._lock:
+            pending = dict(self._frames)
+
+        for key in sorted(pending):
+            for name, frame in sorted(pending[key].items()):
+                if isinstance(frame, numpy.ndarray):
+                    yield "%s %s" % (key, name), frame
+
+
+
+# Helper Functions
+
+def memory_report(components):
+    #------------------------------------------------
+    # components - list of (name, component) where
+    #              component has a buffers() method
+    #
+    # Returns {component: {buffer: bytes}} plus a
+    # "total" entry counting each underlying buffer
+    # once, even when it is shared (e.g. a frame the
+    # viewer is still showing).
+    #------------------------------------------------
+
+    report = {}
+    unique = {}
+
+    for component_name, component in components:
+        rows = {}
+        for name, buf in component.buffers():
+            rows[name] = buf.nbytes
+
+            owner = buf
+            while isinstance(owner.base, numpy.ndarray):
+                owner = owner.base
+            unique[id(owner)] = owner.nbytes
+
+        report[component_name] = rows
+
+    report["total"] = {"unique": sum(unique.values())}
+
+    return report
+
+
+def format_memory_report(report):
+    lines = []
+
+    for component_name in sorted(report):
+        if component_name == "total":
+            continue
+
+        rows = report[component_name]
+        lines.append("%-36s %10.1f KB" % (component_name, sum(rows.values()) / 1024.0))
+
+        for name in sorted(rows):
+            lines.append("    %-32s %10.1f KB" % (name, rows[name] / 1024.0))
+
+    lines.append("%-36s %10.1f KB" % ("total (unique)", report["total"]["unique"] / 1024.0))
+
+    return "\n".join(lines)
@@ -0,0 +1,315 @@
+import argparse
+import datetime
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from settings import Settings
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scans (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    sequence     INTEGER NOT NULL,
+    timestamp    REAL    NOT NULL,
+    camera       TEXT,
+    corners      TEXT,
+    path         TEXT,
+    size         INTEGER,
+    content_hash TEXT,
+    timings      TEXT
+);
+CREATE INDEX IF NOT EXISTS scans_timestamp ON scans (timestamp);
+CREATE INDEX IF NOT EXISTS scans_content_hash ON scans (content_hash);
+"""
+
+COLUMNS = ("sequence", "timestamp", "camera", "corners", "path", "size", "content_hash", "timings")
+
+INSERT = "INSERT INTO scans (%s) VALUES (%s)" % (", ".join(COLUMNS), ", ".join("?" * len(COLUMNS)))
+
+
+class ScanJournal():
+
+    #-------------------------------
+    # init
+    #-------------------------------
+
+    def __init__(self, path=None, batch_size=None, flush_interval=None):
+
+        # settings
+        self.settings = Settings()
+
+        #-------------------------------
+        # Settings
+        #-------------------------------
+
+        self.path = path or self.settings.journal_path
+        self.batch_size = batch_size or self.settings.journal_batch_size
+        self.flush_interval = flush_interval or self.settings.journal_flush_interval
+
+
+        #-------------------------------
+        # Internal Data
+        #-------------------------------
+
+        # hashes queued this session but maybe not committed yet
+        self._recent_hashes = set()
+        self._last_sequence = 0
+
+        self._queue = queue.Queue()
+        self._stop_token = object()
+        self._flush_token = object()
+
+        # reads happen on the caller's thread; WAL lets them run
+        # alongside the writer thread
+        self._read_lock = threading.Lock()
+        self._read_conn = self._connect()
+        self._read_conn.executescript(SCHEMA)
+        self._load_last_sequence()
+
+        self._writer = threading.Thread(target=self._write_loop, name="ScanJournal")
+        self._writer.daemon = True
+        self._writer.start()
+
+
+
+    #-------------------------------
+    # Public Methods
+    #-------------------------------
+
+    # Record
+
+    def record(self, result):
+        # queue a ScanResult for the writer thread
+        row = (
+            result.sequence,
+            result.timestamp,
+            result.camera,
+            json.dumps(result.corners),
+            result.path,
+            result.size,
+            result.content_hash,
+            json.dumps(result.timings),
+        )
+
+        if result.content_hash:
+            self._recent_hashes.add(result.content_hash)
+        self._last_sequence = max(self._last_sequence, result.sequence)
+
+        self._queue.put(row)
+
+
+    def flush(self):
+        # commit what's queued now (don't wait for a full batch or the
+        # flush interval) and block until it's done
+        self._queue.put(self._flush_token)
+        self._queue.join()
+
+
+    def close(self):
+        if self._writer.is_alive():
+            self._queue.put(self._stop_token)
+            self._writer.join()
+
+        with self._read_lock:
+            self._read_conn.close()
+
+
+    # Queries
+
+    def last_sequence(self):
+        return self._last_sequence
+
+
+    def contains_hash(self, content_hash):
+        if content_hash in self._recent_hashes:
+            return True
+
+        rows = self._query("SELECT 1 FROM scans WHERE content_hash = ? LIMIT 1", (content_hash,))
+        return len(rows) > 0
+
+
+    def find_by_hash(self, content_hash):
+        return self._query("SELECT * FROM scans WHERE content_hash = ? ORDER BY timestamp", (content_hash,))
+
+
+    def entries(self, since=None, until=None, limit=None):
+        sql = "SELECT * FROM scans WHERE timestamp >= ? AND timestamp < ? ORDER BY timestamp DESC"
+        params = [since or 0.0, until or float("inf")]
+
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        return self._query(sql, params)
+
+
+    def stats(self):
+        rows = self._query("SELECT COUNT(*) AS count, SUM(size) AS bytes, MIN(timestamp) AS first, MAX(timestamp) AS last FROM scans")
+        return rows[0]
+
+
+
+    #-------------------------------
+    # Private Methods
+    #-------------------------------
+
+    def _connect(self):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+
+        return conn
+
+
+    def _load_last_sequence(self):
+        rows = self._query("SELECT MAX(sequence) AS sequence FROM scans")
+        self._last_sequence = rows[0]["sequence"] or 0
+
+
+    def _query(self, sql, params=()):
+        with self._read_lock:
+            rows = self._read_conn.execute(sql, params).fetchall()
+
+        return [to_entry(row) for row in rows]
+
+
+    def _write_loop(self):
+        #------------------------------------------------
+        # Writer Thread
+        #
+        # Collect rows until we have a full batch, the
+        # flush interval runs out or flush()/close() asks
+        # for it, then commit them in a single transaction.
+        #------------------------------------------------
+
+        conn = self._connect()
+
+        done = False
+        while not done:
+            batch = []
+            tokens = 0
+
+            row = self._queue.get()
+            deadline = time.time() + self.flush_interval
+
+            while True:
+                if row is self._stop_token:
+                    tokens += 1
+                    done = True
+                    break
+
+                if row is self._flush_token:
+                    tokens += 1
+                    break
+
+                batch.append(row)
+                if len(batch) >= self.batch_size:
+                    break
+
+                timeout = deadline - time.time()
+                if timeout <= 0:
+                    break
+
+                try:
+                    row = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+
+            if batch:
+                try:
+                    with conn:
+                        conn.executemany(INSERT, batch)
+                except sqlite3.Error as e:
+                    print("ERROR - journal write failed: %s" % e)
+
+            # one task_done per item pulled off the queue (including
+            # the tokens) so flush() can join()
+            for _ in range(len(batch) + tokens):
+                self._queue.task_done()
+
+        conn.close()
+
+
+
+# Helper Functions
+
+def to_entry(row):
+    entry = dict(zip(row.keys(), row))
+
+    for key in ("corners", "timings"):
+        if entry.get(key):
+            entry[key] = json.loads(entry[key])
+
+    return entry
+
+
+def parse_time(text):
+    if text is None:
+        return None
+
+    return time.mktime(datetime.datetime.strptime(text, "%Y-%m-%d %H:%M:%S").timetuple())
+
+
+def format_time(timestamp):
+    if timestamp is None:
+        return "-"
+
+    return datetime.datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def print_entry(entry):
+    timings = " ".join("%s=%.1fms" % (k, v * 1000.0) for k, v in sorted((entry["timings"] or {}).items()))
+    print("%6d  %s  cam=%s  %9d B  %s  %s  %s" % (
+        entry["sequence"], format_time(entry["timestamp"]), entry["camera"], entry["size"] or 0,
+        (entry["content_hash"] or "-")[:12], entry["path"], timings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the ScanBot scan journal.")
+    parser.add_argument("--db", default=None, help="journal database (default: settings.journal_path)")
+
+    commands = parser.add_subparsers(dest="command")
+
+    list_cmd = commands.add_parser("list", help="list scans, newest first")
+    list_cmd.add_argument("--since", help="'YYYY-MM-DD HH:MM:SS'")
+    list_cmd.add_argument("--until", help="'YYYY-MM-DD HH:MM:SS'")
+    list_cmd.add_argument("--limit", type=int, default=20)
+
+    find_cmd = commands.add_parser("find", help="find scans by content hash")
+    find_cmd.add_argument("content_hash")
+
+    commands.add_parser("stats", help="summary of the journal")
+
+    args = parser.parse_args()
+
+    journal = ScanJournal(path=args.db)
+
+    if args.command == "list":
+        for entry in journal.entries(parse_time(args.since), parse_time(args.until), args.limit):
+            print_entry(entry)
+
+    elif args.command == "find":
+        for entry in journal.find_by_hash(args.content_hash):
+            print_entry(entry)
+
+    else:
+        stats = journal.stats()
+        print("scans: %d" % stats["count"])
+        print("bytes: %d" % (stats["bytes"] or 0))
+        print("first: %s" % format_time(stats["first"]))
+        print("last:  %s" % format_time(stats["last"]))
+
+    journal.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -4,6 +4,7 @@ import imutils
 import numpy
 import time
 
+from frames import MotionState
 from settings import Settings
 
 
@@ -42,24 +43,10 @@ class MotionDetector():
         # Cached Frames
         #-------------------------------
 
-        # full frames
-        self.cur_frame_full = None
-        self.bg_frame_full = None
-        self.prev_frame_full = None
-
-        # processed frames
-        self.cur_frame = None
-        self.cur_frame_gray = None
-
-        self.prev_frame = None
-        self.prev_frame_gray = None
-
-        self.bg_frame = None
-        self.bg_frame_gray = None
-
-        # display frames
-        self.bg_delta = None
-        self.delta_display_frame = None
+        # small processed frames only - the full frame
+        # belongs to the caller
+        self.state = MotionState()
+        self.state.motion_boxes = []
 
 
 
@@ -81,10 +68,13 @@ class MotionDetector():
         return self.motion_detected
 
 
-    def display_frames(self):
-        # Previous Frame Delta
-        if is_valid_frame(self.delta_display_frame):
-            cv2.imshow("Motion Frame", self.delta_display_frame)
+    def display_frames(self, viewer):
+        # Motion Frame
+        viewer.update("Motion Frame", self.state.cur_frame, self.state.motion_boxes)
+
+
+    def buffers(self):
+        return self.state.buffers()
 
 
 
@@ -97,23 +87,25 @@ class MotionDetector():
         # for motion detection.
         #------------------------------------------------
 
-        self.cur_frame_full = frame.copy()
+        state = self.state
 
         # cache the prev frame
-        self.prev_frame_gray = self.cur_frame_gray
+        state.prev_frame_gray = state.cur_frame_gray
         
         # create a smaller version of the image for faster processing
-        self.cur_frame = imutils.resize(self.cur_frame_full, width=500)
+        # (no need to copy the full frame - we only read it)
+        cur_frame = imutils.resize(frame, width=500)
 
         # create a softened (blurred) grayscale version of the smaller image
-        self.cur_frame_gray = cv2.cvtColor(self.cur_frame, cv2.COLOR_BGR2GRAY)
-        self.cur_frame_gray = cv2.GaussianBlur(self.cur_frame_gray, (21, 21), 0)
+        cur_frame_gray = cv2.cvtColor(cur_frame, cv2.COLOR_BGR2GRAY)
+        state.cur_frame_gray = cv2.GaussianBlur(cur_frame_gray, (21, 21), 0)
+
+        # the color frame is only needed for display
+        state.cur_frame = cur_frame if self.display else None
         
-        if not is_valid_frame(self.prev_frame_gray):
-            self.prev_frame_gray = self.cur_frame_gray
+        if not is_valid_frame(state.prev_frame_gray):
+            state.prev_frame_gray = state.cur_frame_gray
             return
-
-        self.delta_display_frame = self.cur_frame.copy()
         
 
         
@@ -126,9 +118,7 @@ class MotionDetector():
         #        Simplify this!
         #------------------------------------------------
 
-        self.delta_display_frame = self.cur_frame.copy()
-        
-        delta_frame = cv2.absdiff(self.prev_frame_gray, self.cur_frame_gray)
+        delta_frame = cv2.absdiff(self.state.prev_frame_gray, self.state.cur_frame_gray)
         
         thresh_delta_frame = cv2.threshold(delta_frame, 25, 255, cv2.THRESH_BINARY)[1]
         thresh_delta_frame = cv2.dilate(thresh_delta_frame, None, iterations=2)
@@ -137,18 +127,21 @@ class MotionDetector():
         contours = imutils.grab_contours(contours)
 
         motion_detected = False
+        motion_boxes = []
         
 	# loop over the contours
         for c in contours:
             if cv2.contourArea(c) >= self.min_motion_area:
                 motion_detected = True
                 
+                # the boxes are drawn by the viewer, not here
                 if self.display:
-                    (x, y, w, h) = cv2.boundingRect(c)
-                    cv2.rectangle(self.delta_display_frame, (x, y), (x + w, y + h), (255, 255, 255), 2)
+                    motion_boxes.append(cv2.boundingRect(c))
                 else:
                     break
 
+        self.state.motion_boxes = motion_boxes
+
         if motion_detected:
             self.last_motion_time = time.time()
 	        
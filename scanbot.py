@@ -1,13 +1,23 @@
 import cv2
 import datetime
+import hashlib
 import imutils
 import numpy
+import os
+import threading
 import time
 
+from concurrent.futures import ThreadPoolExecutor
+
+from corners import refine_corners
 from document import DocumentDetector
+from encoder import Encoder, get_profile
+from frames import PendingFrames, ScanState, format_memory_report, memory_report
+from journal import ScanJournal
 from motion import MotionDetector
 from settings import Settings
 from transform import four_point_transform
+from viewer import DebugViewer
 
 
 class ScanBot():
@@ -28,6 +38,7 @@ class ScanBot():
 
         # display
         self.display = self.settings.display
+        self.viewer = DebugViewer() if self.display else None
  
         # scan
         self.min_roi_area = self.settings.min_roi
@@ -44,6 +55,21 @@ class ScanBot():
         self.save_full_image_scan = self.settings.save_full_image_scan
         self.store_document_callback = self._store_document
         self.store_full_image_callback = self._store_full_image
+        self.output_dir = self.settings.output_dir
+        self.skip_duplicate_scans = self.settings.skip_duplicate_scans
+
+        # encoding - runs on the encoder's thread pool; a single store
+        # thread waits for the encodes and writes the files
+        self.encoder = Encoder()
+        self.document_profile = get_profile(self.settings.document_profile)
+        self.full_image_profile = get_profile(self.settings.full_image_profile)
+        self._store_pool = ThreadPoolExecutor(max_workers=1)
+        self._store_lock = threading.Lock()
+        self._sequence_lock = threading.Lock()
+
+        # journal - resume numbering from the last recorded scan
+        self.journal = ScanJournal()
+        self.scan_sequence = self.journal.last_sequence()
 
 
         #-------------------------------
@@ -58,23 +84,13 @@ class ScanBot():
         # Cached Frames
         #-------------------------------
 
-        # full frames
-        self.cur_frame_full = None
-        self.bg_frame_full = None
-        self.scan_frame_full = None
+        # the full frame lives for one loop iteration; the
+        # detectors keep their own (small) frames, and the
+        # display frames are handed straight to the viewer
+        self.state = ScanState()
 
-        # processed frames
-        self.cur_frame = None
-        self.cur_frame_gray = None
-        self.prev_frame_gray = None
-        self.bg_frame = None
-        self.scan_frame_transform = None
-
-        # display frames
-        self.bg_delta = None
-        self.prev_delta = None
-        self.document_detect_frame = None
-        self.document_transform_frame = None
+        # frames still being encoded/stored in the background
+        self.pending_frames = PendingFrames()
 
 
 
@@ -87,37 +103,99 @@ class ScanBot():
     def start(self):
         self._start_camera()
 
+        if self.viewer != None:
+            self.viewer.start()
+
         done = False
-        
-        while not done:
-            frame = self._capture_frame()
 
-            if is_valid_frame(frame):
-                self.cur_frame_full = frame
+        # always stop - Ctrl-C included - so pending scans get stored
+        # and the journal gets flushed
+        try:
+            while not done:
+                frame = self._capture_frame()
 
-                # Detect
-                self._detect_document()
+                if is_valid_frame(frame):
+                    self.state.cur_frame_full = frame
 
-                # Scan
-                if self.document_detected:
-                    self._scan_document()
+                    # Detect
+                    self._detect_document()
 
-                # Display
-                self._display()
+                    # Scan
+                    if self.document_detected:
+                        self._scan_document()
+
+                    # Display
+                    self._display()
+
+                    # done with the full frame
+                    self.state.cur_frame_full = None
+                    frame = None
+
+                # the viewer thread owns the window (and the keyboard)
+                if self.viewer != None:
+                    done = self.viewer.quit_requested
+
+                    if self.viewer.memory_report_requested:
+                        self.viewer.memory_report_requested = False
+                        print(format_memory_report(self.memory_report()))
+                else:
+                    key = cv2.waitKey(1) & 0xFF
+
+                    if key == ord("q"):
+                        done = True
+        finally:
+            self.stop()
 
-            key = cv2.waitKey(1) & 0xFF
-            
-            if key == ord("q"):
-                done = True
 
-        self.stop()
+    # Memory Report
+
+    def memory_report(self):
+        #------------------------------------------------
+        # Live frame buffers per component, in bytes:
+        # {component: {buffer: bytes}, "total": {...}}
+        # (see frames.format_memory_report)
+        #------------------------------------------------
+
+        components = [
+            ("ScanBot", self),
+            ("MotionDetector", self.motion_detector),
+            ("DocumentDetector", self.document_detector),
+        ]
+
+        if self.viewer != None:
+            components.append(("DebugViewer", self.viewer))
+
+        return memory_report(components)
+
+
+    def buffers(self):
+        for name, buf in self.state.buffers():
+            yield name, buf
+
+        for name, buf in self.pending_frames.buffers():
+            yield "pending " + name, buf
 
 
     # Stop
         
     def stop(self):
+        # what this session was holding (before anything is released)
+        if self.settings.print_memory_report:
+            print(format_memory_report(self.memory_report()))
+
         self._stop_camera()
-        cv2.destroyAllWindows()
+
+        # let the pending scans finish storing before closing the journal
+        self._store_pool.shutdown(wait=True)
+        self.encoder.shutdown()
+        self.journal.close()
+
+        # the viewer thread destroys its own window - HighGUI calls
+        # must not be split across threads
+        if self.viewer != None:
+            self.viewer.stop()
+        else:
+            cv2.destroyAllWindows()
 
         
 
@@ -135,7 +213,7 @@ class ScanBot():
 
         # TODO - handle camera init failure
         
-        self.cam = cv2.VideoCapture(-1)
+        self.cam = cv2.VideoCapture(self.settings.camera_index)
 
         if self.cam == None:
             print("ERROR - cannot find camera!")
@@ -150,13 +228,7 @@ class ScanBot():
                         
 
     def _stop_camera(self):
-        self.cur_frame = None
-        self.cur_frame_gray = None
-        self.prev_frame_gray = None
-        self.bg_frame = None
-
-        self.bg_delta = None
-        self.prev_delta = None
+        self.state.clear()
 
         if self.cam != None:
             self.cam.release()
@@ -175,7 +247,6 @@ class ScanBot():
     #-----------------------------------------------------
     
     def _detect_document(self):
-        self._process_cur_frame()
         self._detect_motion()
 
         #-------------------------------------------------
@@ -195,7 +266,7 @@ class ScanBot():
             return
 
         # TODO - make this work! :)
-        self.document_detected = self.document_detector.detect_documents(self.cur_frame_full)
+        self.document_detected = self.document_detector.detect_documents(self.state.cur_frame_full)
 
         return self.document_detected
             
@@ -213,76 +284,63 @@ class ScanBot():
     #-----------------------------------------------------
 
     def _display(self):
-        if self.settings.display == False:
+        if self.viewer == None:
             return
 
-        # Current Frame
-        cv2.imshow("Current Frame", self.cur_frame)
-
-        # Background Delta
-        if is_valid_frame(self.bg_delta):
-            cv2.imshow("Background Delta", self.bg_delta)
+        #-------------------------------------------------
+        # Just hand the latest frames to the viewer; it
+        # composes and draws the mosaic on its own thread.
+        #-------------------------------------------------
 
         # Motion Frame
-        self.motion_detector.display_frames()
-            
-        # Previous Frame Delta
-        if is_valid_frame(self.prev_delta):
-            cv2.imshow("Prev Frame Delta", self.prev_delta)
+        self.motion_detector.display_frames(self.viewer)
 
-        # Detected Document
-        if is_valid_frame(self.document_detect_frame):
-            cv2.imshow("Document Detected", imutils.resize(self.document_detect_frame, height = 500))
+        # Background Delta
+        self.document_detector.display_frames(self.viewer)
 
-        # Scanned Document
-        if is_valid_frame(self.document_transform_frame):
-            cv2.imshow("Scan", self.document_transform_frame)
+        # (Document Detected and Scan are handed over by _scan)
 
         
     #-----------------------------------------------------
     # Helper Methods
     #-----------------------------------------------------
 
-    def _process_cur_frame(self):
-        # create a smaller version of the image for faster processing
-        self.cur_frame = imutils.resize(self.cur_frame_full, width=500)
-
-        # create a softened (blurred) grayscale version of the smaller image
-        self.cur_frame_gray = cv2.cvtColor(self.cur_frame, cv2.COLOR_BGR2GRAY)
-        self.cur_frame_gray = cv2.GaussianBlur(self.cur_frame_gray, (21, 21), 0)
-
-        # set background frames
-        # (for now, just do this *once* at startup)
-        if not is_valid_frame(self.bg_frame_full):
-            self.bg_frame_full = self.cur_frame_full.copy()
-
-        if not is_valid_frame(self.bg_frame):
-            self.bg_frame = self.cur_frame_gray
-
-
     def _detect_motion(self):
-        self.motion_detected = self.motion_detector.detect_motion(self.cur_frame_full)
+        self.motion_detected = self.motion_detector.detect_motion(self.state.cur_frame_full)
         return self.motion_detected
         
 
     def _scan(self):
+        #------------------------------------------------
+        # Scan
+        #
+        # Find the document in the current frame and
+        # transform it. Returns the transformed image,
+        # the corners (full frame coordinates) and the
+        # stage timings, or None if no document was found.
+        #------------------------------------------------
+
         process_image_height = 500.0
-        
-        orig = self.cur_frame_full
+        timings = {}
+
+        start_time = time.time()
+
+        orig = self.state.cur_frame_full
 
-        image = self.cur_frame_full.copy()
-        ratio = image.shape[0] / process_image_height
-        image = imutils.resize(image, height = int(process_image_height))
+        # (resize makes a new image - no need to copy the full frame)
+        ratio = orig.shape[0] / process_image_height
+        image = imutils.resize(orig, height = int(process_image_height))
 
         gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
         gray = cv2.GaussianBlur(gray, (5, 5), 0)
         edged = cv2.Canny(gray, 75, 200)
 
         # DEBUG
+        # (all windows belong to the viewer thread; this needs a free
+        # tile - see viewer_rows / viewer_columns)
         DEBUG_DISPLAY = False
-        if DEBUG_DISPLAY:
-            if is_valid_frame(edged):
-                cv2.imshow("DEBUG SCAN - Edged", edged)
+        if DEBUG_DISPLAY and self.viewer != None:
+            self.viewer.update("DEBUG SCAN - Edged", edged)
 
 
         # find the largest contours
@@ -297,25 +355,43 @@ class ScanBot():
             if cv2.contourArea(c) <= self.min_roi_area:
                 continue
 
-	    contour_length = cv2.arcLength(c, True)
-	    approx_poly = cv2.approxPolyDP(c, 0.02 * contour_length, True)
+            contour_length = cv2.arcLength(c, True)
+            approx_poly = cv2.approxPolyDP(c, 0.02 * contour_length, True)
 
-	    # if approximated poly has four points then...document?
-	    if len(approx_poly) == 4:
-		document_contours = approx_poly
-		break
+            # if approximated poly has four points then...document?
+            if len(approx_poly) == 4:
+                document_contours = approx_poly
+                break
+
+        timings["detect"] = time.time() - start_time
 
         if type(document_contours) == type(None):
             print("Document Not Found")
-            return
+            return None
 
         # draw the contours of the document
-        cv2.drawContours(image, [document_contours], -1, (0, 255, 0), 2)
-        self.document_detect_frame = image
+        if self.viewer != None:
+            cv2.drawContours(image, [document_contours], -1, (0, 255, 0), 2)
+            self.viewer.update("Document Detected", self.viewer.thumbnail(image))
+
+        corners = document_contours.reshape(4, 2) * ratio
+
+        # refine the (coarse) corners on full resolution patches
+        if self.settings.refine_corners:
+            start_time = time.time()
+            corners = refine_corners(orig, corners, ratio, self.settings.corner_refine_window)
+            timings["refine"] = time.time() - start_time
 
         # finally, transform the document (i.e. remove rotation)
-        document_transform_frame = four_point_transform(orig, document_contours.reshape(4, 2) * ratio)
-        self.document_transform_frame = document_transform_frame
+        start_time = time.time()
+        document_transform_frame = four_point_transform(orig, corners)
+        timings["transform"] = time.time() - start_time
+
+        # (display work stays out of the journaled timings)
+        if self.viewer != None:
+            self.viewer.update("Scan", self.viewer.thumbnail(document_transform_frame))
+
+        return document_transform_frame, corners, timings
 
 
     def _auto_focus(self):
@@ -343,22 +419,172 @@ class ScanBot():
     # Storage
     #------------------------------------------------
 
-    def _store_document(image):
-        pass
+    def _store_document(self, encoded, sequence):
+        return self._write_file(encoded.data, "scan_%06d%s" % (sequence, encoded.profile.extension))
 
-    
-    def _store_full_image(image):
-        pass
+
+    def _store_full_image(self, encoded, sequence):
+        return self._write_file(encoded.data, "scan_%06d_full%s" % (sequence, encoded.profile.extension))
+
+
+    def _write_file(self, data, filename):
+        if not os.path.isdir(self.output_dir):
+            os.makedirs(self.output_dir)
+
+        # never overwrite an earlier scan (raises FileExistsError)
+        path = os.path.join(self.output_dir, filename)
+        with open(path, "xb") as f:
+            f.write(data)
+
+        return path
+
+
+    def _next_sequence(self):
+        # the capture thread and the store thread both take numbers
+        with self._sequence_lock:
+            self.scan_sequence += 1
+            return self.scan_sequence
+
+
+    def _store_scan(self, result, document_future, full_future):
+        #------------------------------------------------
+        # Runs on the store thread: wait for the encodes,
+        # dedup, write the files and record the scan in
+        # the journal.
+        #------------------------------------------------
+
+        # (the sequence can change while storing)
+        pending_key = "scan_%06d" % result.sequence
+
+        try:
+            self._store_encoded(result, document_future, full_future)
+        except Exception as e:
+            # nobody waits on this future - report it here
+            print("ERROR - cannot store scan: %s" % e)
+        finally:
+            self.pending_frames.remove(pending_key)
+
+
+    def _store_encoded(self, result, document_future, full_future):
+        try:
+            encoded = document_future.result()
+        except Exception as e:
+            print("ERROR - cannot encode scan: %s" % e)
+            return
+
+        result.timings["encode"] = encoded.seconds
+
+        # hash the exact bytes we write
+        content_hash = hashlib.sha1(encoded.data).hexdigest()
+
+        full_encoded = None
+        if full_future != None:
+            try:
+                full_encoded = full_future.result()
+            except Exception as e:
+                print("ERROR - cannot encode full image: %s" % e)
+
+        with self._store_lock:
+            if self.skip_duplicate_scans and self.journal.contains_hash(content_hash):
+                print("Duplicate scan - skipped")
+                return
+
+            result.content_hash = content_hash
+            result.size = len(encoded.data)
+
+            start_time = time.time()
+
+            # files left over from a run whose journal wasn't flushed
+            # (e.g. killed) - move on to the next free sequence
+            while result.path == None:
+                try:
+                    result.path = self.store_document_callback(encoded, result.sequence)
+                except FileExistsError:
+                    result.sequence = self._next_sequence()
+
+            if full_encoded != None:
+                try:
+                    self.store_full_image_callback(full_encoded, result.sequence)
+                except FileExistsError as e:
+                    print("ERROR - cannot store full image: %s" % e)
+            result.timings["store"] = time.time() - start_time
+
+            self.journal.record(result)
 
 
 
     def scan(self):
+        #------------------------------------------------
+        # Find, transform and (if enabled) store the
+        # document.  Encoding and storing happen in the
+        # background: path, size and content_hash of the
+        # returned ScanResult are filled in once the scan
+        # has been stored.
+        #------------------------------------------------
+
         print("Scanning...")
 
         # check for scan item
-        self._scan()
+        found = self._scan()
         self.document_scanned = True
 
+        if found is None:
+            return None
+
+        document_image, corners, timings = found
+
+        result = ScanResult()
+        result.timestamp = time.time()
+        result.camera = str(self.settings.camera_index)
+        result.corners = corners.tolist()
+        result.timings = timings
+
+        # number scans in the order they happen, not the order their
+        # encodes finish (a skipped duplicate leaves a gap)
+        result.sequence = self._next_sequence()
+
+        if not self.save_document_scan:
+            # nothing to store, but the scan still goes in the journal
+            with self._store_lock:
+                self.journal.record(result)
+
+            return result
+
+        # both encodes run in parallel on the encoder's pool
+        document_future = self.encoder.submit(document_image, self.document_profile)
+        pending = {"document": document_image}
+
+        full_future = None
+        if self.save_full_image_scan:
+            full_future = self.encoder.submit(self.state.cur_frame_full, self.full_image_profile)
+            pending["full"] = self.state.cur_frame_full
+
+        self.pending_frames.add("scan_%06d" % result.sequence, pending)
+
+        self._store_pool.submit(self._store_scan, result, document_future, full_future)
+
+        return result
+
+
+class ScanResult():
+
+    #------------------------------------------------
+    # What a single scan captured - one row in the
+    # scan journal.
+    #------------------------------------------------
+
+    def __init__(self):
+        self.sequence = 0
+        self.timestamp = None
+        self.camera = None
+        self.corners = None
+        self.path = None
+        self.size = 0
+        self.content_hash = None
+
+        # stage name -> seconds
+        self.timings = {}
+
         
 # Helper Functions
 
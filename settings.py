@@ -4,8 +4,20 @@ class Settings():
 
     def __init__(self):
         # Display Images
+        # (the debug viewer's window runs on a background thread, which
+        # owns every HighGUI call - imshow, waitKey and the 'q'/'m' keys)
         self.display = True
 
+        # Debug Viewer (one mosaic window, redrawn at most viewer_max_fps)
+        self.viewer_max_fps = 10
+        self.viewer_tile_width = 320
+        self.viewer_tile_height = 240
+        self.viewer_columns = 2
+        self.viewer_rows = 2
+
+        # camera device (passed to cv2.VideoCapture)
+        self.camera_index = -1
+
         # capture resolution
         self.capture_height = 1536
         self.capture_width = 2048
@@ -14,6 +26,16 @@ class Settings():
         self.processing_height = 480
         self.processing_width = 640
 
+        # Refine the document corners on full resolution patches
+        # (minimum half size of the sub-pixel search window, in pixels;
+        # it grows with the capture/processing ratio)
+        self.refine_corners = True
+        self.corner_refine_window = 8
+
+        # Print the frame buffer memory report when ScanBot stops
+        # (with display on, press 'm' to print it at any time)
+        self.print_memory_report = True
+
         # Minimum Area of Interest
         self.min_roi = 500
 
@@ -29,3 +51,20 @@ class Settings():
         # Saving Scans
         self.save_document_scan = True
         self.save_full_image_scan = True
+
+        # Encoding profiles (see encoder.PROFILES, or run encoder.py on
+        # some sample scans to compare them)
+        self.document_profile = "png"
+        self.full_image_profile = "jpeg-95"
+        self.encode_workers = 2
+
+        # Scan Output Directory
+        self.output_dir = "scans"
+
+        # Scan Journal (SQLite)
+        self.journal_path = "scans/journal.db"
+        self.journal_batch_size = 32
+        self.journal_flush_interval = 2.0
+
+        # Skip scans whose content hash is already in the journal
+        self.skip_duplicate_scans = True
@@ -0,0 +1,91 @@
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+numpy = pytest.importorskip("numpy")
+imutils = pytest.importorskip("imutils")
+
+from corners import refine_corners
+
+
+FULL_WIDTH = 2048
+FULL_HEIGHT = 1536
+PROCESS_HEIGHT = 500.0
+
+
+def make_quad(rng):
+    # a slightly rotated / skewed document, well inside the frame
+    cx = FULL_WIDTH / 2.0 + rng.uniform(-150, 150)
+    cy = FULL_HEIGHT / 2.0 + rng.uniform(-100, 100)
+    w = rng.uniform(900, 1300) / 2.0
+    h = rng.uniform(700, 1000) / 2.0
+    angle = rng.uniform(-0.25, 0.25)
+
+    quad = []
+    for (dx, dy) in ((-w, -h), (w, -h), (w, h), (-w, h)):
+        dx += rng.uniform(-30, 30)
+        dy += rng.uniform(-30, 30)
+        x = cx + dx * numpy.cos(angle) - dy * numpy.sin(angle)
+        y = cy + dx * numpy.sin(angle) + dy * numpy.cos(angle)
+        quad.append((x, y))
+
+    return numpy.array(quad, dtype="float32")
+
+
+def render(quad):
+    # sub-pixel accurate, anti-aliased white quad on a dark background
+    image = numpy.full((FULL_HEIGHT, FULL_WIDTH, 3), 40, dtype=numpy.uint8)
+    shift = 4
+    points = numpy.round(quad * (1 << shift)).astype(numpy.int32)
+    cv2.fillPoly(image, [points], (230, 230, 230), cv2.LINE_AA, shift)
+    return cv2.GaussianBlur(image, (5, 5), 0)
+
+
+def coarse_corners(image, min_roi_area=500):
+    # the same quad search ScanBot._scan runs on the processed image
+    ratio = image.shape[0] / PROCESS_HEIGHT
+    small = imutils.resize(image, height=int(PROCESS_HEIGHT))
+
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    gray = cv2.GaussianBlur(gray, (5, 5), 0)
+    edged = cv2.Canny(gray, 75, 200)
+
+    contours = cv2.findContours(edged.copy(), cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+    contours = imutils.grab_contours(contours)
+    contours = sorted(contours, key=cv2.contourArea, reverse=True)[:10]
+
+    for c in contours:
+        if cv2.contourArea(c) <= min_roi_area:
+            continue
+
+        approx_poly = cv2.approxPolyDP(c, 0.02 * cv2.arcLength(c, True), True)
+        if len(approx_poly) == 4:
+            return approx_poly.reshape(4, 2) * ratio, ratio
+
+    assert False, "no quad found"
+
+
+def corner_errors(true_quad, corners):
+    # distance from each true corner to the nearest found corner
+    return [numpy.min(numpy.hypot(*(corners - p).T)) for p in true_quad]
+
+
+def test_refine_corners_reaches_true_corners():
+    rng = numpy.random.RandomState(28)
+
+    for _ in range(40):
+        quad = make_quad(rng)
+        image = render(quad)
+
+        coarse, ratio = coarse_corners(image)
+        refined = refine_corners(image, coarse, ratio)
+
+        assert max(corner_errors(quad, refined)) < 1.5
+
+
+def test_refine_corners_keeps_corners_near_the_frame_edge():
+    image = numpy.zeros((FULL_HEIGHT, FULL_WIDTH, 3), dtype=numpy.uint8)
+    corners = numpy.array([[1, 1], [FULL_WIDTH - 2, 1], [FULL_WIDTH - 2, FULL_HEIGHT - 2], [1, FULL_HEIGHT - 2]], dtype="float32")
+
+    refined = refine_corners(image, corners, FULL_HEIGHT / PROCESS_HEIGHT)
+
+    assert numpy.array_equal(refined, corners)
@@ -0,0 +1,59 @@
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+numpy = pytest.importorskip("numpy")
+
+from encoder import PROFILES, Encoder, encode
+
+
+LOSSLESS = ("png", "png-fast", "png-small", "webp-lossless", "gray-png")
+
+
+def make_image():
+    image = numpy.zeros((240, 320, 3), dtype=numpy.uint8)
+    image[:] = (30, 120, 200)
+    cv2.circle(image, (160, 120), 80, (200, 40, 90), -1)
+    cv2.putText(image, "ScanBot", (40, 220), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (255, 255, 255), 2)
+    return image
+
+
+def decode(encoded):
+    return cv2.imdecode(numpy.frombuffer(encoded.data, dtype=numpy.uint8), cv2.IMREAD_UNCHANGED)
+
+
+@pytest.mark.parametrize("name", sorted(PROFILES))
+def test_profile_round_trips(name):
+    profile = PROFILES[name]
+    image = make_image()
+
+    encoded = encode(image, name)
+    decoded = decode(encoded)
+
+    assert decoded is not None
+
+    expected = image
+    if profile.grayscale:
+        expected = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+    assert decoded.shape == expected.shape
+
+    if name in LOSSLESS:
+        assert numpy.array_equal(decoded, expected)
+    else:
+        assert cv2.PSNR(expected, decoded) > 25.0
+
+
+def test_encoder_pool():
+    encoder = Encoder(workers=2)
+    image = make_image()
+
+    futures = [encoder.submit(image, name) for name in sorted(PROFILES)]
+    encoder.shutdown()
+
+    for name, future in zip(sorted(PROFILES), futures):
+        assert future.result().profile.name == name
+
+
+def test_unknown_profile():
+    with pytest.raises(ValueError):
+        encode(make_image(), "tiff-9000")
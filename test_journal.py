@@ -0,0 +1,113 @@
+import sqlite3
+import time
+
+from journal import ScanJournal
+
+
+class FakeResult():
+
+    def __init__(self, sequence):
+        self.sequence = sequence
+        self.timestamp = 1000.0 + sequence
+        self.camera = "0"
+        self.corners = [[0, 0], [10, 0], [10, 10], [0, 10]]
+        self.path = "scan_%06d.png" % sequence
+        self.size = 100 + sequence
+        self.content_hash = "hash%d" % sequence
+        self.timings = {"detect": 0.01}
+
+
+def committed_rows(path):
+    # a separate connection only sees committed rows
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM scans").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def wait_for_rows(path, count, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if committed_rows(path) == count:
+            return True
+        time.sleep(0.02)
+
+    return False
+
+
+def test_commits_a_full_batch(tmp_path):
+    path = str(tmp_path / "journal.db")
+    journal = ScanJournal(path=path, batch_size=3, flush_interval=60.0)
+
+    for sequence in range(1, 5):
+        journal.record(FakeResult(sequence))
+
+    # the first three go out as soon as the batch is full, the fourth
+    # waits for more rows (or the interval)
+    assert wait_for_rows(path, 3)
+    time.sleep(0.2)
+    assert committed_rows(path) == 3
+
+    journal.close()
+
+
+def test_commits_after_the_flush_interval(tmp_path):
+    path = str(tmp_path / "journal.db")
+    journal = ScanJournal(path=path, batch_size=100, flush_interval=0.2)
+
+    journal.record(FakeResult(1))
+
+    assert wait_for_rows(path, 1)
+
+    journal.close()
+
+
+def test_flush_commits_everything_in_order(tmp_path):
+    path = str(tmp_path / "journal.db")
+    journal = ScanJournal(path=path, batch_size=100, flush_interval=60.0)
+
+    for sequence in range(1, 11):
+        journal.record(FakeResult(sequence))
+    journal.flush()
+
+    assert committed_rows(path) == 10
+
+    # newest first
+    entries = journal.entries()
+    assert [entry["sequence"] for entry in entries] == list(range(10, 0, -1))
+    assert entries[0]["corners"] == FakeResult(10).corners
+    assert entries[0]["timings"] == {"detect": 0.01}
+
+    journal.close()
+
+
+def test_resumes_after_reopening(tmp_path):
+    path = str(tmp_path / "journal.db")
+
+    journal = ScanJournal(path=path)
+    for sequence in range(1, 4):
+        journal.record(FakeResult(sequence))
+    journal.close()
+
+    journal = ScanJournal(path=path)
+    assert journal.last_sequence() == 3
+    assert journal.contains_hash("hash2")
+    assert not journal.contains_hash("hash4")
+    assert journal.find_by_hash("hash2")[0]["path"] == "scan_000002.png"
+    journal.close()
+
+
+def test_close_commits_queued_rows(tmp_path):
+    path = str(tmp_path / "journal.db")
+    journal = ScanJournal(path=path, batch_size=100, flush_interval=60.0)
+
+    for sequence in range(1, 6):
+        journal.record(FakeResult(sequence))
+
+    start_time = time.time()
+    journal.close()
+
+    # close doesn't wait for the flush interval
+    assert time.time() - start_time < 5.0
+    assert committed_rows(path) == 5
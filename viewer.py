@@ -0,0 +1,205 @@
+import cv2
+import numpy
+import threading
+import time
+
+from settings import Settings
+
+
+class DebugViewer():
+
+    #------------------------------------------------
+    # Debug Viewer
+    #
+    # Shows all of the debug frames as one mosaic
+    # window.  The processing loop only hands over
+    # references to its latest frames (update); the
+    # mosaic is composed and drawn on the viewer's
+    # own thread at a capped frame rate.
+    #
+    # Frames passed to update() must not be modified
+    # afterwards - hand over a new array instead.
+    #------------------------------------------------
+
+    #-------------------------------
+    # init
+    #-------------------------------
+
+    def __init__(self, window_name="ScanBot"):
+
+        # settings
+        self.settings = Settings()
+
+        #-------------------------------
+        # Settings
+        #-------------------------------
+
+        self.window_name = window_name
+        self.max_fps = self.settings.viewer_max_fps
+        self.tile_width = self.settings.viewer_tile_width
+        self.tile_height = self.settings.viewer_tile_height
+        self.columns = self.settings.viewer_columns
+        self.rows = self.settings.viewer_rows
+
+
+        #-------------------------------
+        # Internal Data
+        #-------------------------------
+
+        self.quit_requested = False
+        self.memory_report_requested = False
+
+        # name -> (frame, boxes); tile order is the order names first appear
+        self._snapshot = {}
+        self._tile_names = []
+        self._dirty = False
+        self._lock = threading.Lock()
+
+        self._running = False
+        self._thread = None
+
+        # the mosaic is drawn into the same canvas every time
+        self.canvas = numpy.zeros((self.rows * self.tile_height, self.columns * self.tile_width, 3), dtype=numpy.uint8)
+
+
+
+    #-------------------------------
+    # Public Methods
+    #-------------------------------
+
+    def start(self):
+        if self._running:
+            return
+
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="DebugViewer")
+        self._thread.daemon = True
+        self._thread.start()
+
+
+    def stop(self):
+        self._running = False
+
+        if self._thread != None:
+            self._thread.join()
+            self._thread = None
+
+
+    def buffers(self):
+        yield "canvas", self.canvas
+
+        with self._lock:
+            snapshot = dict(self._snapshot)
+
+        for name in sorted(snapshot):
+            yield name, snapshot[name][0]
+
+
+    def thumbnail(self, frame):
+        # a copy no bigger than a tile - for frames we shouldn't keep
+        # alive at full resolution just for display
+        (h, w) = frame.shape[:2]
+        scale = min(float(self.tile_width) / w, float(self.tile_height) / h, 1.0)
+        size = (max(1, int(w * scale)), max(1, int(h * scale)))
+
+        return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+
+    def update(self, name, frame, boxes=None):
+        # cheap - just swaps references under the lock
+        if not is_valid_frame(frame):
+            return
+
+        with self._lock:
+            if name not in self._snapshot:
+                if len(self._tile_names) >= self.rows * self.columns:
+                    return
+                self._tile_names.append(name)
+
+            self._snapshot[name] = (frame, boxes)
+            self._dirty = True
+
+
+
+    #-------------------------------
+    # Private Methods
+    #-------------------------------
+
+    def _run(self):
+        interval = 1.0 / self.max_fps
+
+        try:
+            while self._running:
+                start_time = time.time()
+
+                with self._lock:
+                    dirty = self._dirty
+                    self._dirty = False
+                    snapshot = dict(self._snapshot)
+                    tile_names = list(self._tile_names)
+
+                if dirty:
+                    self._compose(snapshot, tile_names)
+                    cv2.imshow(self.window_name, self.canvas)
+
+                # sleep off the rest of the frame; waitKey also pumps the GUI events
+                remaining = interval - (time.time() - start_time)
+                if remaining > 0.001:
+                    time.sleep(remaining - 0.001)
+
+                key = cv2.waitKey(1) & 0xFF
+                if key == ord("q"):
+                    self.quit_requested = True
+                elif key == ord("m"):
+                    self.memory_report_requested = True
+
+            cv2.destroyWindow(self.window_name)
+
+        except cv2.error as e:
+            # no display / headless build / GUI backend error - without
+            # the window there's no way to press 'q', so ask to quit
+            print("ERROR - debug viewer failed: %s" % e)
+            self.quit_requested = True
+
+
+    def _compose(self, snapshot, tile_names):
+        for index, name in enumerate(tile_names):
+            frame, boxes = snapshot[name]
+
+            x = (index % self.columns) * self.tile_width
+            y = (index // self.columns) * self.tile_height
+            tile = self.canvas[y:y + self.tile_height, x:x + self.tile_width]
+
+            self._draw_tile(tile, name, frame, boxes)
+
+
+    def _draw_tile(self, tile, name, frame, boxes):
+        # fit the frame into the tile, keeping its aspect ratio
+        (h, w) = frame.shape[:2]
+        scale = min(float(self.tile_width) / w, float(self.tile_height) / h)
+        scaled_w = max(1, int(w * scale))
+        scaled_h = max(1, int(h * scale))
+
+        tile[:] = 0
+
+        scaled = cv2.resize(frame, (scaled_w, scaled_h), interpolation=cv2.INTER_AREA)
+        if len(scaled.shape) == 2:
+            scaled = cv2.cvtColor(scaled, cv2.COLOR_GRAY2BGR)
+
+        # annotate the (freshly allocated) scaled frame, not the canvas view
+        if boxes:
+            for (x, y, bw, bh) in boxes:
+                top_left = (int(x * scale), int(y * scale))
+                bottom_right = (int((x + bw) * scale), int((y + bh) * scale))
+                cv2.rectangle(scaled, top_left, bottom_right, (0, 255, 0), 1)
+
+        cv2.putText(scaled, name, (5, 15), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (0, 255, 255), 1)
+
+        tile[:scaled_h, :scaled_w] = scaled
+
+
+
+# Helper Functions
+
+def is_valid_frame(frame):
+    return type(frame) != type(None)